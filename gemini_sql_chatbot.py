@@ -4,7 +4,7 @@ import google.generativeai as genai
 from dotenv import load_dotenv
 from tools.sql_tool import execute_sql
 import logging
-from typing import Tuple, Optional
+from typing import Callable, Tuple, Optional
 from prompts import BASE_SYSTEM_PROMPT
 
 logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -23,6 +23,9 @@ MODEL_NAME = "gemini-2.0-flash"
 generation_config = {"temperature": 0.4, "top_p": 0.95, "top_k": 64, "max_output_tokens": 8192, "response_mime_type": "text/plain"}
 SAFETY_SETTINGS = [ {"category": c, "threshold": "BLOCK_MEDIUM_AND_ABOVE"} for c in ["HARM_CATEGORY_HARASSMENT", "HARM_CATEGORY_HATE_SPEECH", "HARM_CATEGORY_SEXUALLY_EXPLICIT", "HARM_CATEGORY_DANGEROUS_CONTENT"]]
 BASE_SYSTEM_PROMPT = BASE_SYSTEM_PROMPT
+llm_usage_hook: Optional[Callable[[int, int], None]] = None # Called with (prompt_tokens, output_tokens) per Gemini call
+# Every failure text send_to_gemini can return, process_interaction reports them as "[AI Error]"
+AI_ERROR_PREFIXES = ("Error:", "My response", "I received", "The AI response", "AI returned", "AI response unprocessable", "AI comm error")
 
 # --- Core Functions ---
 def initialize_chat_session(schema_info: str, db_name: str):
@@ -36,6 +39,8 @@ def send_to_gemini(current_turn_content: str, session):
     if not session: return "Error: Chat session invalid."
     try:
         response = session.send_message(current_turn_content)
+        usage = getattr(response, "usage_metadata", None)
+        if llm_usage_hook and usage: llm_usage_hook(usage.prompt_token_count, usage.candidates_token_count)
         if response.prompt_feedback and response.prompt_feedback.block_reason:
             return f"My response was blocked (Reason: {response.prompt_feedback.block_reason}). Rephrase."
         try:
@@ -87,9 +92,11 @@ async def find_and_execute_sql(text: str, current_db_config: dict) -> Optional[T
     return None # No SQL found
 
 # Updated: Return type hint and logic for the new tuple structure
-async def process_interaction(user_input: str, current_db_config: dict, current_chat_session) -> Tuple[str, Optional[str], Optional[str]]:
+async def process_interaction(user_input: str, current_db_config: dict, current_chat_session,
+                              schema_notice: Optional[str] = None) -> Tuple[str, Optional[str], Optional[str]]:
     """
     Handles one interaction turn.
+    `schema_notice` (schema changes since the session was created) is prepended to the user turn.
     Returns tuple: (ai_message_user, exec_status_client, executing_msg_client)
     """
     if not current_chat_session:
@@ -100,9 +107,10 @@ async def process_interaction(user_input: str, current_db_config: dict, current_
     executing_msg_client: Optional[str] = None
 
     # 1. User -> AI
-    ai_response_text = send_to_gemini(user_input, current_chat_session)
+    user_turn = f"{schema_notice}\n\nUser message: {user_input}" if schema_notice else user_input
+    ai_response_text = send_to_gemini(user_turn, current_chat_session)
 
-    if ai_response_text.startswith(("Error:", "My response", "I received", "The AI response")):
+    if ai_response_text.startswith(AI_ERROR_PREFIXES):
         log.error(f"Initial AI error/block: {ai_response_text}")
         return ai_response_text, "[AI Error]", None # Return None for executing message
 
@@ -120,7 +128,7 @@ async def process_interaction(user_input: str, current_db_config: dict, current_
         log.debug("Sending tool result to AI for synthesis.")
         final_response_to_show = send_to_gemini(tool_result_content, current_chat_session)
 
-        if final_response_to_show.startswith(("Error:", "My response", "I received", "The AI response")):
+        if final_response_to_show.startswith(AI_ERROR_PREFIXES):
             log.error(f"Synthesis AI error/block: {final_response_to_show}")
             # Return AI error, but keep original status and executing message
             return f"Executed ({executing_msg_client} -> {exec_status_client}), but AI failed processing result: {final_response_to_show}", exec_status_client, executing_msg_client
@@ -8,7 +8,11 @@ from pydantic import BaseModel
 from dotenv import load_dotenv
 import uvicorn
 
-from tools.sql_tool import get_schema_info
+from tools.sql_tool import get_schema_details, SCHEMA_PROMPT_FORMAT
+from tools.schema_model import DatabaseSchema
+from tools.schema_watcher import SchemaWatcher
+from tools.index_advisor import recommend_indexes
+from tools.replay import RECORD_DIR, TranscriptRecorder
 from gemini_sql_chatbot import (
     db_config,
     initialize_chat_session,
@@ -20,7 +24,8 @@ log = logging.getLogger(__name__)
 
 load_dotenv()
 
-app_state = {"chat_session": None, "schema_info": None, "initialized": False, "initialization_error": None}
+app_state = {"chat_session": None, "schema_info": None, "schema": None, "schema_watcher": None,
+             "session_schema_version": 0, "transcript_recorder": None, "initialized": False, "initialization_error": None}
 
 # --- Pydantic Models ---
 class UserInput(BaseModel):
@@ -31,6 +36,12 @@ class AIResponse(BaseModel):
     executing_command: Optional[str] = None
     execution_status: Optional[str] = None
 
+def on_schema_change(schema: DatabaseSchema, _delta):
+    """Swaps the schema used for new sessions; the live session is caught up via the watcher's delta notice."""
+    app_state["schema"] = schema
+    app_state["schema_info"] = schema.render(SCHEMA_PROMPT_FORMAT) if schema.tables else "Schema Info: No tables found in the database."
+    print("   Schema change detected, schema refreshed.")
+
 # --- Lifespan ---
 # Corrected: Parameter renamed to _app to avoid shadowing and indicate unused status
 @asynccontextmanager
@@ -55,8 +66,10 @@ async def lifespan(_app: FastAPI): # Changed 'app' to '_app'
     # Proceed with initialization if no early errors
     try:
         print("   Loading schema...")
-        schema = await get_schema_info(db_config)
-        if schema.startswith("Schema Error:"): raise ConnectionError(schema)
+        schema_details, schema_error = await get_schema_details(db_config)
+        if schema_error and schema_error.startswith("Schema Error:"): raise ConnectionError(schema_error)
+        schema = schema_details.render(SCHEMA_PROMPT_FORMAT) if schema_details else schema_error
+        app_state["schema"] = schema_details or DatabaseSchema(database=db_config.get('database', ''))
         app_state["schema_info"] = schema
         print("   Schema OK.")
 
@@ -66,6 +79,17 @@ async def lifespan(_app: FastAPI): # Changed 'app' to '_app'
         app_state["chat_session"] = session
         print("   AI OK.")
 
+        watcher = SchemaWatcher(db_config, app_state["schema"], on_change=on_schema_change, schema_format=SCHEMA_PROMPT_FORMAT)
+        watcher.start()
+        app_state["schema_watcher"] = watcher
+        app_state["session_schema_version"] = watcher.version
+
+        if RECORD_DIR:
+            recorder = TranscriptRecorder(RECORD_DIR, db_config.get('database', ''), app_state["schema"])
+            recorder.install()
+            app_state["transcript_recorder"] = recorder
+            print(f"   Recording transcripts to {recorder.path}")
+
         app_state["initialized"] = True
         app_state["initialization_error"] = None
         print("--- Initialization Complete ---")
@@ -83,6 +107,7 @@ async def lifespan(_app: FastAPI): # Changed 'app' to '_app'
     # --- Shutdown ---
     log.warning("Application shutting down.")
     print("\n--- Server Shutting Down ---")
+    if app_state["schema_watcher"]: await app_state["schema_watcher"].stop()
     app_state["chat_session"] = None # Clear state on shutdown
     app_state["initialized"] = False
 
@@ -120,7 +145,16 @@ async def chat_endpoint(user_input: UserInput):
 
     log.info(f"Processing chat: '{msg[:50]}...'")
     try:
-        final_response_msg, exec_status, executing_msg = await process_interaction(msg, db_config, session)
+        schema_notice, notice_version = None, app_state["session_schema_version"]
+        watcher = app_state.get("schema_watcher")
+        if watcher:
+            schema_notice, notice_version = watcher.notice_since(app_state["session_schema_version"])
+        recorder = app_state.get("transcript_recorder")
+        interaction = recorder.process_interaction if recorder else process_interaction
+        final_response_msg, exec_status, executing_msg = await interaction(msg, db_config, session, schema_notice)
+        # An AI error means the notice never reached the chat history; keep it pending for the next turn
+        if exec_status not in ("[AI Error]", "[Internal Error]"):
+            app_state["session_schema_version"] = notice_version
 
         log.info(f"Response: '{final_response_msg[:100]}...' | Status: {exec_status} | Executing: {executing_msg}")
         return AIResponse(
@@ -134,6 +168,20 @@ async def chat_endpoint(user_input: UserInput):
         log.error(f"Error during chat processing: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail="Internal Server Error processing request.")
 
+@app.get("/advisor/indexes", summary="Index Advisor Report", tags=["Advisor"])
+async def index_advisor_endpoint():
+    """Ranks candidate indexes from the recorded query workload. Advice only, nothing is applied."""
+    schema = app_state.get("schema") # Kept current by the schema watcher
+    if schema is None:
+        schema, error_msg = await get_schema_details(db_config)
+        if error_msg:
+            raise HTTPException(status_code=503, detail=f"Service Unavailable: {error_msg}")
+    try:
+        return {"recommendations": recommend_indexes(schema)}
+    except Exception as e:
+        log.error(f"Error building index advisor report: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal Server Error building advisor report.")
+
 # --- Run Server ---
 if __name__ == "__main__":
     print("Starting FastAPI server via uvicorn...")
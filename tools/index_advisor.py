@@ -0,0 +1,276 @@
+"""
+Index advisor: ranks candidate composite indexes from the recorded query workload.
+
+Advice only -- nothing here ever runs DDL against the database.
+Run standalone with `python -m tools.index_advisor`.
+"""
+import re
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from tools.schema_model import DatabaseSchema, TableSchema
+from tools.workload import WorkloadRecorder, workload_recorder
+
+log = logging.getLogger(__name__)
+
+MAX_INDEX_COLUMNS = 4
+SCAN_ACCESS_TYPES = ("ALL", "index") # EXPLAIN access types that read the whole table/index
+MIN_SCAN_SAVING = 0.5 # Assumed saving when EXPLAIN reports filtered=100 (no statistics) on a scan
+FILESORT_SAVING = 0.3 # Assumed share of a table's work spent sorting when an index could return rows in order
+
+_SQL_KEYWORDS = {
+    "where", "on", "using", "join", "inner", "left", "right", "outer", "cross", "natural", "straight_join",
+    "group", "order", "limit", "having", "union", "as", "set", "window", "for", "lock", "into",
+}
+_TABLE_REF_RE = re.compile(r"\b(?:from|join)\s+`?(\w+)`?(?:\s+(?:as\s+)?`?(\w+)`?)?", re.IGNORECASE)
+# A clause ends at the next clause keyword or at the `)` closing an enclosing subquery, see `_clause_texts`
+_WHERE_RE = re.compile(r"\bwhere\b", re.IGNORECASE)
+_WHERE_END_RE = re.compile(r"\b(?:group\s+by|order\s+by|limit|having|union|window|for\s+update)\b", re.IGNORECASE)
+_ON_RE = re.compile(r"\bon\b(.*?)(?=\bwhere\b|\b(?:inner|left|right|cross|natural)?\s*join\b|\bgroup\s+by\b|\border\s+by\b|\blimit\b|$)",
+                    re.IGNORECASE | re.DOTALL)
+_ORDER_BY_RE = re.compile(r"\border\s+by\b", re.IGNORECASE)
+_ORDER_BY_END_RE = re.compile(r"\b(?:limit|for\s+update|union)\b", re.IGNORECASE)
+_QUOTED_RE = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\"|`[^`]*`")
+_COLUMN_REF = r"(?:`?(\w+)`?\s*\.\s*)?`?(\w+)`?"
+_EQ_PRED_RE = re.compile(_COLUMN_REF + r"\s*(?:=|<=>|\bin\s*\(|\bis\s+null\b)", re.IGNORECASE)
+_JOIN_RHS_RE = re.compile(r"=\s*" + _COLUMN_REF, re.IGNORECASE)
+_PLAIN_COLUMN_RE = re.compile(r"\s*" + _COLUMN_REF + r"\s*")
+_RANGE_PRED_RE = re.compile(_COLUMN_REF + r"\s*(?:<=|>=|<(?!>)|(?<!<)>|\bbetween\b|\blike\s+'(?!%))", re.IGNORECASE)
+
+
+def _clause_texts(sql: str, start_re: re.Pattern, end_re: re.Pattern) -> List[str]:
+    """
+    Text of every clause opened by `start_re`. Parentheses are tracked, so IN lists, function calls and
+    nested groups stay inside the clause; it ends at `end_re` on its own nesting level, at the `)` closing
+    an enclosing subquery, or at the end of the statement. Quoted literals and identifiers are skipped.
+    """
+    texts = []
+    for start in start_re.finditer(sql):
+        pos, depth = start.end(), 0
+        while pos < len(sql):
+            char = sql[pos]
+            if char in "'\"`":
+                quoted = _QUOTED_RE.match(sql, pos)
+                if quoted:
+                    pos = quoted.end()
+                    continue
+            if char == "(":
+                depth += 1
+            elif char == ")":
+                if depth == 0: break
+                depth -= 1
+            elif depth == 0 and end_re.match(sql, pos):
+                break
+            pos += 1
+        texts.append(sql[start.end():pos])
+    return texts
+
+def _table_aliases(sql: str, schema: DatabaseSchema) -> Dict[str, str]:
+    """Maps every name a table is referred to by (alias or own name, lowercased) to its schema table name."""
+    aliases = {}
+    for table_ref, alias in _TABLE_REF_RE.findall(sql):
+        table = schema.find_table(table_ref)
+        if table is None: continue
+        aliases[table.name.lower()] = table.name
+        if alias and alias.lower() not in _SQL_KEYWORDS:
+            aliases[alias.lower()] = table.name
+    return aliases
+
+def _resolve_column(qualifier: str, column: str, aliases: Dict[str, str], schema: DatabaseSchema) -> Optional[Tuple[str, str]]:
+    """Returns (table_name, column_name) for a column reference, or None if it is not a schema column."""
+    if qualifier:
+        table_name = aliases.get(qualifier.lower())
+        if table_name is None: return None
+        col = schema.tables[table_name].find_column(column)
+        return (table_name, col.name) if col else None
+    # Unqualified: only resolvable if exactly one table in the query has that column
+    matches = []
+    for table_name in set(aliases.values()):
+        col = schema.tables[table_name].find_column(column)
+        if col: matches.append((table_name, col.name))
+    return matches[0] if len(matches) == 1 else None
+
+def _collect(pattern: re.Pattern, text: str, aliases: Dict[str, str], schema: DatabaseSchema,
+             into: Dict[str, List[str]]):
+    for qualifier, column in pattern.findall(text):
+        resolved = _resolve_column(qualifier, column, aliases, schema)
+        if resolved is None: continue
+        table_name, column_name = resolved
+        if column_name not in into.setdefault(table_name, []):
+            into[table_name].append(column_name)
+
+def extract_predicates(sql: str, schema: DatabaseSchema) -> Dict[str, Dict[str, List[str]]]:
+    """
+    Finds the columns a query filters, joins and sorts on, grouped per table.
+    Returns {table: {"eq": [...], "join": [...], "range": [...], "order": [...]}}. Heuristic, regex based.
+    "eq" are WHERE equalities; "join" are ON columns, only bound when the table is not the first in the join order.
+    """
+    aliases = _table_aliases(sql, schema)
+    if not aliases: return {}
+    eq_cols: Dict[str, List[str]] = {}
+    join_cols: Dict[str, List[str]] = {}
+    range_cols: Dict[str, List[str]] = {}
+    order_cols: Dict[str, List[str]] = {}
+
+    filter_text = " ".join(_clause_texts(sql, _WHERE_RE, _WHERE_END_RE))
+    join_text = " ".join(m.group(1) for m in _ON_RE.finditer(sql))
+    _collect(_EQ_PRED_RE, filter_text, aliases, schema, eq_cols)
+    _collect(_EQ_PRED_RE, join_text, aliases, schema, join_cols)
+    _collect(_JOIN_RHS_RE, join_text, aliases, schema, join_cols)
+    _collect(_RANGE_PRED_RE, filter_text, aliases, schema, range_cols)
+    for order_clause in _clause_texts(sql, _ORDER_BY_RE, _ORDER_BY_END_RE):
+        order_text = re.sub(r"\b(?:asc|desc)\b", "", order_clause, flags=re.IGNORECASE)
+        # Only plain column references; expressions like ORDER BY COUNT(*) cannot use an index
+        plain_items = " ".join(item for item in order_text.split(",") if _PLAIN_COLUMN_RE.fullmatch(item))
+        _collect(_PLAIN_COLUMN_RE, plain_items, aliases, schema, order_cols)
+
+    predicates = {}
+    for table_name in set(eq_cols) | set(join_cols) | set(range_cols) | set(order_cols):
+        predicates[table_name] = {
+            "eq": eq_cols.get(table_name, []),
+            "join": [c for c in join_cols.get(table_name, []) if c not in eq_cols.get(table_name, [])],
+            "range": [c for c in range_cols.get(table_name, []) if c not in eq_cols.get(table_name, [])],
+            "order": order_cols.get(table_name, []),
+        }
+    return predicates
+
+def candidate_columns(predicates: Dict[str, List[str]], driving: bool = False) -> List[str]:
+    """
+    Classic composite index ordering: equality columns, then one range column, else the sort columns.
+    Join columns count as equalities except on the driving (first) table, where no join value is bound yet.
+    """
+    columns = list(predicates["eq"])
+    if not driving:
+        columns += [c for c in predicates.get("join", []) if c not in columns]
+    if predicates["range"]:
+        columns.append(predicates["range"][0])
+    else:
+        columns += [c for c in predicates["order"] if c not in columns]
+    return columns[:MAX_INDEX_COLUMNS]
+
+def _scan_rows(plan: list, aliases: Dict[str, str]) -> Dict[str, dict]:
+    """Plan rows (keyed by schema table name) where MySQL scans, or uses an index but still sorts (filesort)."""
+    scans = {}
+    for row in plan:
+        table_name = aliases.get(str(row.get("table") or "").lower())
+        if table_name is None: continue
+        extra = str(row.get("Extra") or "")
+        if _is_scan(row) or "filesort" in extra:
+            scans[table_name] = row
+    return scans
+
+def _is_scan(plan_row: dict) -> bool:
+    return plan_row.get("type") in SCAN_ACCESS_TYPES or plan_row.get("key") is None
+
+def _estimated_saving(entry: dict, plan_row: dict, total_rows_examined: float) -> float:
+    """
+    Share of the fingerprint's total time spent on this table, times the share of work an index would skip:
+    the filtered-out rows for a scan, or the sort for an index lookup that still needs a filesort.
+    """
+    rows = float(plan_row.get("rows") or 0)
+    work_share = rows / total_rows_examined if total_rows_examined else 1.0
+    if not _is_scan(plan_row):
+        return entry["total_ms"] * work_share * FILESORT_SAVING
+    filtered = float(plan_row["filtered"]) if plan_row.get("filtered") is not None else 100.0
+    skipped = 1.0 - filtered / 100.0
+    if plan_row.get("type") in SCAN_ACCESS_TYPES: skipped = max(skipped, MIN_SCAN_SAVING)
+    return entry["total_ms"] * work_share * skipped
+
+def _served_by_existing_index(table: TableSchema, columns: Tuple[str, ...]) -> bool:
+    """
+    DESCRIBE marks the leading column of every index (PRI/UNI/MUL), so a single-column candidate on such a
+    column is a left prefix of an index that already exists. Composite indexes beyond that are not known here.
+    """
+    return len(columns) == 1 and columns[0] in table.keyed_columns()
+
+def _index_name(table_name: str, columns: List[str]) -> str:
+    return f"idx_{table_name}_{'_'.join(columns)}"[:64] # MySQL identifier limit
+
+def _merge_prefixes(candidates: Dict[Tuple[str, Tuple[str, ...]], dict]) -> List[dict]:
+    """A composite index also serves its left prefixes, so fold prefix candidates into the longest one."""
+    keys = sorted(candidates, key=lambda k: len(k[1]), reverse=True)
+    merged = {}
+    for table_name, columns in keys:
+        target = next((k for k in merged if k[0] == table_name and k[1][:len(columns)] == columns), None)
+        candidate = candidates[(table_name, columns)]
+        if target is None:
+            merged[(table_name, columns)] = candidate
+            continue
+        merged[target]["estimated_saving_ms"] += candidate["estimated_saving_ms"]
+        merged[target]["calls"] += candidate["calls"]
+        merged[target]["fingerprints"] += candidate["fingerprints"]
+    return list(merged.values())
+
+def recommend_indexes(schema: DatabaseSchema, recorder: WorkloadRecorder = workload_recorder) -> List[dict]:
+    """Ranks candidate composite indexes by the total query time they would be expected to save."""
+    candidates: Dict[Tuple[str, Tuple[str, ...]], dict] = {}
+    for entry in recorder.fingerprints():
+        plan = entry.get("plan")
+        if not plan: continue
+        sql = entry["sample_sql"]
+        aliases = _table_aliases(sql, schema)
+        scans = _scan_rows(plan, aliases)
+        if not scans: continue
+        predicates = extract_predicates(sql, schema)
+        driving_table = aliases.get(str(plan[0].get("table") or "").lower()) # EXPLAIN lists tables in join order
+        total_rows_examined = sum(float(row.get("rows") or 0) for row in plan)
+
+        for table_name, plan_row in scans.items():
+            if table_name not in predicates: continue
+            table_predicates = predicates[table_name]
+            if not _is_scan(plan_row):
+                # Index lookup plus filesort: only an (equality..., sort...) index removes the sort,
+                # a range predicate in between would force the sort again
+                if table_predicates["range"] or not table_predicates["order"]: continue
+            columns = tuple(candidate_columns(table_predicates, driving=table_name == driving_table))
+            if not columns or _served_by_existing_index(schema.tables[table_name], columns): continue
+            if plan_row.get("type") == "index" and "filesort" not in str(plan_row.get("Extra") or "") \
+                    and set(columns) <= set(table_predicates["order"]):
+                continue # Full index scan in ORDER BY order (typically with LIMIT): the used key already sorts
+
+            candidate = candidates.setdefault((table_name, columns), {
+                "table": table_name,
+                "columns": list(columns),
+                "ddl": f"CREATE INDEX `{_index_name(table_name, list(columns))}` ON `{table_name}` "
+                       f"({', '.join(f'`{c}`' for c in columns)});",
+                "estimated_saving_ms": 0.0,
+                "calls": 0,
+                "fingerprints": [],
+            })
+            candidate["estimated_saving_ms"] += _estimated_saving(entry, plan_row, total_rows_examined)
+            candidate["calls"] += entry["calls"]
+            candidate["fingerprints"].append(entry["fingerprint"])
+
+    recommendations = _merge_prefixes(candidates)
+    for rec in recommendations:
+        rec["estimated_saving_ms"] = round(rec["estimated_saving_ms"], 2)
+    recommendations.sort(key=lambda rec: rec["estimated_saving_ms"], reverse=True)
+    return recommendations
+
+def format_report(recommendations: List[dict]) -> str:
+    if not recommendations:
+        return "Index Advisor: no candidate indexes (no recorded queries scan or filesort a table with indexable predicates)."
+    lines = ["Index Advisor (advice only, review before applying):", ""]
+    for rank, rec in enumerate(recommendations, start=1):
+        lines.append(f"{rank}. {rec['ddl']}")
+        lines.append(f"   est. saving: {rec['estimated_saving_ms']:.1f} ms over {rec['calls']} call(s), "
+                     f"{len(rec['fingerprints'])} query shape(s)")
+        for fingerprint in rec["fingerprints"][:3]:
+            lines.append(f"     - {fingerprint[:120]}{'...' if len(fingerprint) > 120 else ''}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import os
+    import asyncio
+    from dotenv import load_dotenv
+    from tools.sql_tool import get_schema_details
+
+    load_dotenv()
+    cli_db_config = {"host": os.environ.get("DB_HOST", "localhost"), "user": os.environ.get("DB_USER"),
+                     "password": os.environ.get("DB_PASSWORD"), "database": os.environ.get("DB_NAME")}
+    cli_schema, schema_error = asyncio.run(get_schema_details(cli_db_config))
+    if schema_error:
+        print(schema_error)
+        raise SystemExit(1)
+    print(format_report(recommend_indexes(cli_schema)))
@@ -0,0 +1,365 @@
+"""
+Record/replay of chat turns for offline regression and load testing of `process_interaction`.
+
+Recording: set SQL_AI_RECORD_DIR and run the server. The schema behind the system prompt and every turn
+(user input, model outputs, SQL issued, SQL results, token usage and stage latencies) are written to a JSON
+transcript in that directory.
+
+Replay: `python -m tools.replay <fixtures dir or file> [--concurrency N] [--speedup X] [--update-baseline]`
+drives `process_interaction` fully offline against the recorded model outputs and SQL results, and fails
+(exit code 1) when outputs, SQL issued, LLM calls per turn, tokens or latencies regress against the baseline.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import threading
+import contextvars
+import dataclasses
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from prompts import BASE_SYSTEM_PROMPT
+from tools.schema_model import SCHEMA_FORMATS, DatabaseSchema
+from tools.schema_tokens import estimate_tokens
+
+log = logging.getLogger(__name__)
+
+RECORD_DIR = os.environ.get("SQL_AI_RECORD_DIR")
+DEFAULT_FIXTURE_DIR = "replay_fixtures"
+DEFAULT_BASELINE_PATH = "replay_baseline.json"
+LATENCY_TOLERANCE = 0.25 # Allowed relative increase of p95 latencies
+TOKEN_TOLERANCE = 0.05   # Allowed relative increase of (estimated) prompt/output tokens per turn
+LATENCY_SLACK_MS = 5.0   # Absolute slack so sub-millisecond overheads do not flap
+
+_current_turn: contextvars.ContextVar = contextvars.ContextVar("replay_current_turn", default=None)
+_current_llm_call: contextvars.ContextVar = contextvars.ContextVar("replay_current_llm_call", default=None)
+
+
+def _elapsed_ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 3)
+
+def _turn_key(conversation: str, index: int) -> str:
+    return f"{conversation}#{index}"
+
+
+# --- Recording ---
+class TranscriptRecorder:
+    """Wraps `send_to_gemini`/`execute_sql` and writes one JSON transcript per server run."""
+
+    def __init__(self, record_dir: str, db_name: str = "", schema: Optional[DatabaseSchema] = None):
+        os.makedirs(record_dir, exist_ok=True)
+        name = f"session-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        self.path = os.path.join(record_dir, f"{name}.json")
+        # The structured schema (not the rendered text) so replays price the system prompt with the current serializer
+        self.transcript = {"name": name, "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "db_name": db_name,
+                           "schema": dataclasses.asdict(schema) if schema else None, "turns": []}
+        self._lock = threading.Lock()
+
+    def install(self):
+        import gemini_sql_chatbot as chatbot
+        original_send, original_execute = chatbot.send_to_gemini, chatbot.execute_sql
+
+        def recording_send(content: str, session):
+            turn = _current_turn.get()
+            if turn is None: return original_send(content, session)
+            call = {"input": content, "output": None, "latency_ms": None, "prompt_tokens": None, "output_tokens": None}
+            token = _current_llm_call.set(call)
+            start = time.perf_counter()
+            try:
+                call["output"] = original_send(content, session)
+            finally:
+                call["latency_ms"] = _elapsed_ms(start)
+                _current_llm_call.reset(token)
+                turn["llm_calls"].append(call)
+            return call["output"]
+
+        async def recording_execute(sql_command: str, db_config: dict) -> str:
+            turn = _current_turn.get()
+            if turn is None: return await original_execute(sql_command, db_config)
+            start = time.perf_counter()
+            result = await original_execute(sql_command, db_config)
+            turn["sql_calls"].append({"sql": sql_command, "result": result, "latency_ms": _elapsed_ms(start)})
+            return result
+
+        def record_usage(prompt_tokens: int, output_tokens: int):
+            call = _current_llm_call.get()
+            if call is not None:
+                call["prompt_tokens"], call["output_tokens"] = prompt_tokens, output_tokens
+
+        chatbot.send_to_gemini = recording_send
+        chatbot.execute_sql = recording_execute
+        chatbot.llm_usage_hook = record_usage
+        log.warning(f"Recording chat transcripts to {self.path}")
+
+    async def process_interaction(self, user_input: str, current_db_config: dict, current_chat_session,
+                                  schema_notice: Optional[str] = None) -> Tuple[str, Optional[str], Optional[str]]:
+        """Drop-in for `process_interaction` that records the turn."""
+        import gemini_sql_chatbot as chatbot
+        turn = {"user_input": user_input, "schema_notice": schema_notice, "llm_calls": [], "sql_calls": []}
+        token = _current_turn.set(turn)
+        start = time.perf_counter()
+        try:
+            result = await chatbot.process_interaction(user_input, current_db_config, current_chat_session, schema_notice)
+        finally:
+            _current_turn.reset(token)
+        turn["latency_ms"] = _elapsed_ms(start)
+        turn["response"] = list(result)
+        self._append(turn)
+        return result
+
+    def _append(self, turn: dict):
+        with self._lock:
+            self.transcript["turns"].append(turn)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.transcript, f, indent=2, default=str)
+            os.replace(tmp_path, self.path) # Never leave a half-written fixture behind
+
+
+# --- Replay ---
+class _ReplaySession:
+    """Stands in for the Gemini chat session; replayed calls never touch it."""
+
+def _replay_wait_seconds(recorded_ms: Optional[float], state: dict) -> float:
+    if not recorded_ms or state["speedup"] <= 0: return 0.0
+    return recorded_ms / state["speedup"] / 1000
+
+def _replay_send(content: str, session) -> str:
+    state = _current_turn.get()
+    recorded = state["fixture_turn"]["llm_calls"]
+    index = len(state["llm_calls"])
+    if index >= len(recorded):
+        state["unexpected_llm_calls"] += 1
+        output = "Error: replay has no recorded model output for this call."
+    else:
+        if recorded[index]["input"] != content: state["changed_llm_inputs"] += 1
+        start = time.perf_counter()
+        time.sleep(_replay_wait_seconds(recorded[index].get("latency_ms"), state)) # send_to_gemini is blocking too
+        state["llm_ms"] += _elapsed_ms(start)
+        output = recorded[index]["output"]
+    # The chat session sends the system prompt and the whole history with every message
+    conversation = state["conversation"]
+    input_tokens, output_tokens = estimate_tokens(content), estimate_tokens(output)
+    state["llm_calls"].append({"prompt_tokens_est": conversation["system_tokens"] + conversation["history_tokens"] + input_tokens,
+                               "output_tokens_est": output_tokens})
+    conversation["history_tokens"] += input_tokens + output_tokens
+    return output
+
+async def _replay_execute(sql_command: str, db_config: dict) -> str:
+    state = _current_turn.get()
+    recorded = state["fixture_turn"]["sql_calls"]
+    index = len(state["sql_issued"])
+    state["sql_issued"].append(sql_command)
+    if index >= len(recorded) or recorded[index]["sql"] != sql_command:
+        return "Error: replay has no recorded result for this SQL."
+    start = time.perf_counter()
+    await asyncio.sleep(_replay_wait_seconds(recorded[index].get("latency_ms"), state))
+    state["sql_ms"] += _elapsed_ms(start)
+    return recorded[index]["result"]
+
+def install_replay():
+    import gemini_sql_chatbot as chatbot
+    chatbot.send_to_gemini = _replay_send
+    chatbot.execute_sql = _replay_execute
+    chatbot.llm_usage_hook = None
+
+def load_fixtures(path: str) -> List[dict]:
+    paths = [path] if os.path.isfile(path) else sorted(
+        os.path.join(path, name) for name in os.listdir(path) if name.endswith(".json"))
+    fixtures = []
+    for fixture_path in paths:
+        with open(fixture_path, encoding="utf-8") as f:
+            fixture = json.load(f)
+        fixture["name"] = os.path.splitext(os.path.basename(fixture_path))[0] # Unique per file, keys the baseline
+        fixtures.append(fixture)
+    return fixtures
+
+def _system_prompt_tokens(fixture: dict, schema_format: str) -> int:
+    """Estimated tokens of the system prompt the recorded session would get from the current prompt and serializer."""
+    if not fixture.get("schema"):
+        log.warning(f"Fixture '{fixture['name']}' has no recorded schema, system prompt tokens are not counted.")
+        return 0
+    schema = DatabaseSchema.from_dict(fixture["schema"])
+    return estimate_tokens(BASE_SYSTEM_PROMPT.format(schema_placeholder=schema.render(schema_format), db_name=fixture.get("db_name", "")))
+
+def _recorded_tokens(fixture_turn: dict, key: str) -> Optional[int]:
+    """Sum of the real usage Gemini reported while recording, None if any call lacks it."""
+    counts = [call.get(key) for call in fixture_turn["llm_calls"]]
+    return None if None in counts else sum(counts)
+
+async def replay_conversation(fixture: dict, speedup: float, schema_format: str = "compact") -> List[dict]:
+    """Replays one recorded conversation turn by turn and returns per-turn metrics."""
+    import gemini_sql_chatbot as chatbot
+    session = _ReplaySession()
+    db_config = {"database": fixture.get("db_name", "")}
+    conversation = {"system_tokens": _system_prompt_tokens(fixture, schema_format), "history_tokens": 0}
+    metrics = []
+    for index, fixture_turn in enumerate(fixture["turns"]):
+        state = {"fixture_turn": fixture_turn, "speedup": speedup, "conversation": conversation, "llm_calls": [],
+                 "sql_issued": [], "unexpected_llm_calls": 0, "changed_llm_inputs": 0, "llm_ms": 0.0, "sql_ms": 0.0}
+        token = _current_turn.set(state)
+        start = time.perf_counter()
+        try:
+            result = await chatbot.process_interaction(fixture_turn["user_input"], db_config, session,
+                                                       fixture_turn.get("schema_notice"))
+        finally:
+            _current_turn.reset(token)
+        latency_ms = _elapsed_ms(start)
+        recorded_sql = [call["sql"] for call in fixture_turn["sql_calls"]]
+        metrics.append({
+            "turn": _turn_key(fixture["name"], index),
+            "response": list(result),
+            "response_ok": list(result) == fixture_turn["response"],
+            "sql_issued": state["sql_issued"],
+            "sql_ok": state["sql_issued"] == recorded_sql,
+            "llm_calls": len(state["llm_calls"]),
+            "recorded_llm_calls": len(fixture_turn["llm_calls"]),
+            "unexpected_llm_calls": state["unexpected_llm_calls"],
+            "changed_llm_inputs": state["changed_llm_inputs"],
+            "prompt_tokens_est": sum(call["prompt_tokens_est"] for call in state["llm_calls"]),
+            "output_tokens_est": sum(call["output_tokens_est"] for call in state["llm_calls"]),
+            "recorded_prompt_tokens": _recorded_tokens(fixture_turn, "prompt_tokens"),
+            "recorded_output_tokens": _recorded_tokens(fixture_turn, "output_tokens"),
+            "latency_ms": latency_ms,
+            "overhead_ms": round(max(0.0, latency_ms - state["llm_ms"] - state["sql_ms"]), 3),
+            "llm_ms": round(state["llm_ms"], 3),
+            "sql_ms": round(state["sql_ms"], 3),
+        })
+    return metrics
+
+def run_replay(fixtures: List[dict], concurrency: int = 1, speedup: float = 0.0,
+               schema_format: str = "compact") -> Tuple[List[dict], float]:
+    """
+    Replays all fixtures, `concurrency` conversations at a time (each on its own thread and event loop,
+    since the LLM call path is blocking). speedup=0 skips the recorded waits entirely.
+    Returns tuple: (per-turn metrics, total wall time in ms).
+    """
+    install_replay()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        results = list(pool.map(lambda fixture: asyncio.run(replay_conversation(fixture, speedup, schema_format)), fixtures))
+    return [metric for conversation in results for metric in conversation], _elapsed_ms(start)
+
+def _percentile(values: List[float], fraction: float) -> float:
+    if not values: return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def _total_recorded(metrics: List[dict], key: str) -> Optional[int]:
+    counts = [m[key] for m in metrics]
+    return None if None in counts else sum(counts)
+
+def summarize(metrics: List[dict], wall_ms: float, concurrency: int, speedup: float, schema_format: str = "compact") -> dict:
+    latencies = [m["latency_ms"] for m in metrics]
+    overheads = [m["overhead_ms"] for m in metrics]
+    return {
+        "settings": {"concurrency": concurrency, "speedup": speedup, "schema_format": schema_format},
+        "turns": len(metrics),
+        "response_mismatches": sum(not m["response_ok"] for m in metrics),
+        "sql_mismatches": sum(not m["sql_ok"] for m in metrics),
+        "unexpected_llm_calls": sum(m["unexpected_llm_calls"] for m in metrics),
+        "changed_llm_inputs": sum(m["changed_llm_inputs"] for m in metrics),
+        "llm_calls": sum(m["llm_calls"] for m in metrics),
+        "prompt_tokens_est": sum(m["prompt_tokens_est"] for m in metrics),
+        "output_tokens_est": sum(m["output_tokens_est"] for m in metrics),
+        "recorded_prompt_tokens": _total_recorded(metrics, "recorded_prompt_tokens"),
+        "recorded_output_tokens": _total_recorded(metrics, "recorded_output_tokens"),
+        "latency_p50_ms": _percentile(latencies, 0.5),
+        "latency_p95_ms": _percentile(latencies, 0.95),
+        "overhead_p50_ms": _percentile(overheads, 0.5),
+        "overhead_p95_ms": _percentile(overheads, 0.95),
+        "wall_ms": wall_ms,
+        "turns_per_second": round(len(metrics) / (wall_ms / 1000), 2) if wall_ms else 0.0,
+        "per_turn": {m["turn"]: {key: m[key] for key in ("response", "sql_issued", "llm_calls", "prompt_tokens_est", "output_tokens_est")}
+                     for m in metrics},
+    }
+
+def compare_to_baseline(summary: dict, baseline: Optional[dict], latency_tolerance: float = LATENCY_TOLERANCE,
+                        token_tolerance: float = TOKEN_TOLERANCE) -> List[str]:
+    """Returns the list of regressions (empty means pass)."""
+    failures = []
+    # Correctness against the recorded transcripts themselves
+    if summary["response_mismatches"]: failures.append(f"{summary['response_mismatches']} turn(s) respond differently than recorded")
+    if summary["sql_mismatches"]: failures.append(f"{summary['sql_mismatches']} turn(s) issue different SQL than recorded")
+    if summary["unexpected_llm_calls"]: failures.append(f"{summary['unexpected_llm_calls']} LLM call(s) beyond the recording")
+    if baseline is None: return failures
+
+    if baseline.get("settings") != summary["settings"]:
+        log.warning(f"Baseline was taken with {baseline.get('settings')}, this run uses {summary['settings']}; latency comparison is indicative only.")
+    for turn, current in summary["per_turn"].items():
+        previous = baseline.get("per_turn", {}).get(turn)
+        if previous is None: continue
+        if current["response"] != previous["response"]: failures.append(f"{turn}: response changed vs baseline")
+        if current["sql_issued"] != previous["sql_issued"]: failures.append(f"{turn}: SQL issued changed vs baseline")
+        if current["llm_calls"] > previous["llm_calls"]:
+            failures.append(f"{turn}: LLM calls {previous['llm_calls']} -> {current['llm_calls']}")
+        for key in ("prompt_tokens_est", "output_tokens_est"):
+            if key in previous and current[key] > previous[key] * (1 + token_tolerance):
+                failures.append(f"{turn}: {key} {previous[key]} -> {current[key]}")
+    for key in ("latency_p95_ms", "overhead_p95_ms"):
+        limit = baseline.get(key, 0.0) * (1 + latency_tolerance) + LATENCY_SLACK_MS
+        if summary[key] > limit:
+            failures.append(f"{key}: {baseline.get(key)} -> {summary[key]} (limit {limit:.1f})")
+    return failures
+
+def format_summary(summary: dict) -> str:
+    return "\n".join([
+        f"Replayed {summary['turns']} turn(s) at concurrency {summary['settings']['concurrency']}, "
+        f"speedup {summary['settings']['speedup']} in {summary['wall_ms']:.0f} ms ({summary['turns_per_second']} turns/s)",
+        f"  mismatches: responses {summary['response_mismatches']}, SQL {summary['sql_mismatches']}, "
+        f"unexpected LLM calls {summary['unexpected_llm_calls']} (changed LLM inputs: {summary['changed_llm_inputs']})",
+        f"  LLM calls {summary['llm_calls']}, est. prompt/output tokens {summary['prompt_tokens_est']}/{summary['output_tokens_est']} "
+        f"(recorded usage: {summary['recorded_prompt_tokens'] if summary['recorded_prompt_tokens'] is not None else 'n/a'}/"
+        f"{summary['recorded_output_tokens'] if summary['recorded_output_tokens'] is not None else 'n/a'})",
+        f"  latency p50/p95 {summary['latency_p50_ms']:.1f}/{summary['latency_p95_ms']:.1f} ms, "
+        f"pipeline overhead p50/p95 {summary['overhead_p50_ms']:.1f}/{summary['overhead_p95_ms']:.1f} ms",
+    ])
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Replay recorded SQL-AI conversations offline and check for regressions.")
+    parser.add_argument("fixtures", nargs="?", default=DEFAULT_FIXTURE_DIR, help="Fixture file or directory of recorded transcripts.")
+    parser.add_argument("--concurrency", type=int, default=1, help="Conversations replayed at the same time.")
+    parser.add_argument("--speedup", type=float, default=0.0, help="Replay recorded latencies N times faster (0 = no waits).")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE_PATH, help="Baseline metrics file.")
+    parser.add_argument("--schema-format", choices=SCHEMA_FORMATS, default=os.environ.get("SCHEMA_PROMPT_FORMAT", "compact"),
+                        help="Schema format used to price the system prompt (defaults to SCHEMA_PROMPT_FORMAT).")
+    parser.add_argument("--update-baseline", action="store_true", help="Write this run as the new baseline.")
+    parser.add_argument("--latency-tolerance", type=float, default=LATENCY_TOLERANCE)
+    parser.add_argument("--token-tolerance", type=float, default=TOKEN_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    # Replay is fully offline; the chatbot module only needs a key to be present at import time
+    os.environ.setdefault("GEMINI_API_KEY", "offline-replay")
+    fixtures = load_fixtures(args.fixtures)
+    if not fixtures:
+        print(f"No fixtures found in '{args.fixtures}'.")
+        return 1
+
+    metrics, wall_ms = run_replay(fixtures, args.concurrency, args.speedup, args.schema_format)
+    summary = summarize(metrics, wall_ms, args.concurrency, args.speedup, args.schema_format)
+    print(format_summary(summary))
+
+    baseline = None
+    if os.path.exists(args.baseline) and not args.update_baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    failures = compare_to_baseline(summary, baseline, args.latency_tolerance, args.token_tolerance)
+    if baseline is None and not failures:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2, default=str)
+        print(f"Baseline written to {args.baseline}.")
+
+    if failures:
+        print("REGRESSIONS:")
+        for failure in failures: print(f"  - {failure}")
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
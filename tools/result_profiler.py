@@ -0,0 +1,188 @@
+"""
+Streaming result-set profiler.
+
+Large query results are summarized batch by batch with NumPy/pandas-vectorized accumulators, so the
+model gets accurate statistics about the whole result without the result ever being materialized
+or pasted into the prompt. Memory per column is bounded (fixed reservoir, top-k table, HLL registers).
+"""
+import math
+import datetime
+import decimal
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+PROFILE_BATCH_ROWS = 5000     # Rows fetched from the cursor per batch
+QUANTILE_SAMPLE_SIZE = 4096   # Reservoir size per numeric column (exact quantiles below this many rows)
+TOP_K = 5                     # Most frequent values shown per column
+TOP_K_CAPACITY = 512          # Candidate values tracked per column before the rarest are pruned
+HLL_PRECISION = 12            # 4096 registers, ~1.6% standard error on distinct counts
+MAX_VALUE_DISPLAY_LEN = 40
+
+_NUMERIC_TYPES = (int, float, decimal.Decimal, np.integer, np.floating)
+_TEMPORAL_TYPES = (datetime.datetime, datetime.date)
+_U64 = np.uint64
+
+
+def _count_leading_zeros(words: np.ndarray) -> np.ndarray:
+    """Vectorized count of leading zero bits of uint64 values (64 for zero)."""
+    words = words.copy()
+    zeros = np.zeros(len(words), dtype=np.uint8)
+    for shift in (32, 16, 8, 4, 2, 1):
+        top_clear = (words >> _U64(64 - shift)) == 0
+        zeros[top_clear] += shift
+        words[top_clear] <<= _U64(shift)
+    zeros[words == 0] += 1 # The loop stops at 63 for an all-zero word
+    return zeros
+
+
+class HyperLogLog:
+    """HyperLogLog distinct counter over 64-bit hashes, updated a whole batch at a time."""
+
+    def __init__(self, precision: int = HLL_PRECISION):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def add_hashes(self, hashes: np.ndarray):
+        if not len(hashes): return
+        hashes = hashes.astype(np.uint64, copy=False)
+        index = (hashes >> _U64(64 - self.precision)).astype(np.intp)
+        remainder = hashes << _U64(self.precision)
+        rank = np.minimum(_count_leading_zeros(remainder), 64 - self.precision) + 1
+        np.maximum.at(self.registers, index, rank.astype(np.uint8))
+
+    def estimate(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.power(2.0, -self.registers.astype(np.float64)))
+        empty = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and empty: # Small-range correction (linear counting)
+            return int(round(m * math.log(m / empty)))
+        return int(round(raw))
+
+
+class ColumnProfile:
+    """Bounded-memory accumulators for one result column."""
+
+    def __init__(self, name: str, seed: int = 0):
+        self.name = name
+        self.kind: Optional[str] = None # numeric / temporal / text, decided by the first non-null value
+        self.count = 0
+        self.nulls = 0
+        self.min = None
+        self.max = None
+        self.total = 0.0
+        self.numeric_seen = 0
+        self.reservoir = np.empty(QUANTILE_SAMPLE_SIZE, dtype=np.float64)
+        self.text_length_total = 0
+        self.top_counts: Optional[pd.Series] = None # value -> count
+        self.hll = HyperLogLog()
+        self._rng = np.random.default_rng(seed)
+
+    @staticmethod
+    def _detect_kind(value) -> str:
+        if isinstance(value, bool): return "text"
+        if isinstance(value, _NUMERIC_TYPES): return "numeric"
+        if isinstance(value, _TEMPORAL_TYPES): return "temporal"
+        return "text"
+
+    def update(self, values: pd.Series):
+        self.count += len(values)
+        non_null = values.dropna()
+        self.nulls += len(values) - len(non_null)
+        if non_null.empty: return
+        if self.kind is None: self.kind = self._detect_kind(non_null.iloc[0])
+
+        if self.kind == "numeric":
+            numbers = pd.to_numeric(non_null, errors="coerce").dropna().to_numpy(dtype=np.float64)
+            self._update_numeric(numbers)
+        elif self.kind == "temporal":
+            stamps = pd.to_datetime(non_null, errors="coerce").dropna()
+            if not stamps.empty: self._update_range(stamps.min(), stamps.max())
+        else:
+            text = non_null.astype(str)
+            self.text_length_total += int(text.str.len().sum())
+
+        self._update_top_k(non_null)
+        self.hll.add_hashes(pd.util.hash_array(non_null.astype(str).to_numpy(dtype=object)))
+
+    def _update_range(self, low, high):
+        self.min = low if self.min is None or low < self.min else self.min
+        self.max = high if self.max is None or high > self.max else self.max
+
+    def _update_numeric(self, numbers: np.ndarray):
+        if not len(numbers): return
+        self._update_range(float(numbers.min()), float(numbers.max()))
+        self.total += float(numbers.sum())
+        # Batched reservoir sampling (Algorithm R): item j of the stream replaces slot r if r < k, r ~ U[0, j]
+        positions = np.arange(self.numeric_seen, self.numeric_seen + len(numbers))
+        fill = positions < QUANTILE_SAMPLE_SIZE
+        self.reservoir[positions[fill]] = numbers[fill]
+        if not fill.all():
+            slots = self._rng.integers(0, positions[~fill] + 1)
+            accepted = slots < QUANTILE_SAMPLE_SIZE
+            self.reservoir[slots[accepted]] = numbers[~fill][accepted]
+        self.numeric_seen += len(numbers)
+
+    def _update_top_k(self, non_null: pd.Series):
+        keys = non_null if self.kind != "text" else non_null.astype(str)
+        counts = keys.value_counts(sort=False)
+        self.top_counts = counts if self.top_counts is None else self.top_counts.add(counts, fill_value=0)
+        if len(self.top_counts) > TOP_K_CAPACITY:
+            # Keep the most frequent candidates; counts of pruned values are lost, so top-k is approximate
+            self.top_counts = self.top_counts.nlargest(TOP_K_CAPACITY // 2)
+
+    def quantiles(self, probabilities=(0.25, 0.5, 0.75, 0.95)) -> List[float]:
+        sample = self.reservoir[:min(self.numeric_seen, QUANTILE_SAMPLE_SIZE)]
+        return [float(q) for q in np.quantile(sample, probabilities)] if len(sample) else []
+
+    def distinct_estimate(self) -> int:
+        return min(self.hll.estimate(), self.count - self.nulls)
+
+    def to_text(self) -> str:
+        parts = [f"nulls {self.nulls}"]
+        if self.kind == "numeric" and self.numeric_seen:
+            mean = self.total / self.numeric_seen
+            q25, q50, q75, q95 = self.quantiles()
+            parts.append(f"min {_fmt(self.min)}, max {_fmt(self.max)}, mean {_fmt(mean)}")
+            parts.append(f"p25/p50/p75/p95 {_fmt(q25)}/{_fmt(q50)}/{_fmt(q75)}/{_fmt(q95)}")
+        elif self.kind == "temporal" and self.min is not None:
+            parts.append(f"min {self.min}, max {self.max}")
+        elif self.kind == "text" and self.count > self.nulls:
+            parts.append(f"avg length {_fmt(self.text_length_total / (self.count - self.nulls))}")
+        if self.count > self.nulls:
+            parts.append(f"~distinct {self.distinct_estimate()}")
+            top = self.top_counts.nlargest(TOP_K)
+            if top.iloc[0] > 1:
+                parts.append("top: " + ", ".join(f"{_fmt(value)} ({int(n)})" for value, n in top.items()))
+            else:
+                parts.append("no repeated values")
+        return f"- {self.name} ({self.kind or 'empty'}): " + "; ".join(parts)
+
+
+def _fmt(value) -> str:
+    if isinstance(value, float):
+        return f"{value:.6g}"
+    text = str(value)
+    return text if len(text) <= MAX_VALUE_DISPLAY_LEN else text[:MAX_VALUE_DISPLAY_LEN - 3] + "..."
+
+
+class ResultProfiler:
+    """Feeds batches of dict rows (as returned by a dictionary cursor) into per-column profiles."""
+
+    def __init__(self, column_names: List[str]):
+        self.columns = [ColumnProfile(name, seed=i) for i, name in enumerate(column_names)]
+        self.row_count = 0
+
+    def update(self, rows: List[dict]):
+        if not rows: return
+        batch = pd.DataFrame(rows, columns=[col.name for col in self.columns])
+        self.row_count += len(batch)
+        for col in self.columns:
+            col.update(batch[col.name])
+
+    def to_text(self) -> str:
+        lines = [f"Result profile (computed over all {self.row_count} rows; ~ = approximate):"]
+        lines += [col.to_text() for col in self.columns]
+        return "\n".join(lines)
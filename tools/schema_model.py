@@ -0,0 +1,199 @@
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set
+
+SCHEMA_FORMATS = ("compact", "verbose")
+COMMON_COLUMN_MIN_TABLES = 3 # A column (same name and type) in at least this many tables is listed once
+
+# MySQL type -> short form used by the compact serializer. Display widths like int(11) are dropped.
+_TYPE_ABBREVIATIONS = {
+    "tinyint": "ti", "smallint": "si", "mediumint": "mi", "int": "i", "integer": "i", "bigint": "bi",
+    "decimal": "dec", "numeric": "dec", "float": "f", "double": "dbl", "real": "dbl", "bit": "bit",
+    "varchar": "vc", "char": "c", "tinytext": "txt", "text": "txt", "mediumtext": "txt", "longtext": "txt",
+    "varbinary": "vb", "binary": "bin", "blob": "blob", "tinyblob": "blob", "mediumblob": "blob", "longblob": "blob",
+    "datetime": "dt", "timestamp": "ts", "date": "d", "time": "t", "year": "y",
+    "json": "json", "enum": "enum", "set": "set", "boolean": "bool", "bool": "bool",
+}
+_SIZED_TYPES = ("vc", "c", "vb", "bin", "dec", "enum", "set") # Keep the (...) part for these
+_TYPE_RE = re.compile(r"^\s*(\w+)\s*(?:\((.*)\))?\s*(.*)$", re.DOTALL)
+_QUOTED_VALUE_RE = re.compile(r"'((?:[^']|'')*)'")
+
+# Short form -> full name, only the entries actually used are put in the legend
+_TYPE_LEGEND = {
+    "i": "int", "bi": "bigint", "si": "smallint", "mi": "mediumint", "ti": "tinyint", "dec": "decimal",
+    "f": "float", "dbl": "double", "vc": "varchar", "c": "char", "txt": "text", "vb": "varbinary", "bin": "binary",
+    "dt": "datetime", "ts": "timestamp", "d": "date", "t": "time", "y": "year",
+}
+COMPACT_LEGEND = (
+    "Format: table(column:type, ...) -> fk_column>ref_table.ref_column. "
+    "Markers: * primary key, ! unique, ? nullable, + auto_increment."
+)
+
+def compact_legend(tables: Iterable["TableSchema"]) -> str:
+    """COMPACT_LEGEND plus the short type names actually used by `tables`."""
+    used_types = {re.sub(r"\(.*|u$", "", abbreviate_type(col.type)) for table in tables for col in table.columns}
+    type_legend = ", ".join(f"{short}={full}" for short, full in _TYPE_LEGEND.items() if short in used_types)
+    return COMPACT_LEGEND + (f" Types: {type_legend}, u suffix=unsigned." if type_legend else "")
+
+def abbreviate_type(mysql_type: str) -> str:
+    """e.g. "int(10) unsigned" -> "iu", "varchar(255)" -> "vc(255)", "tinyint(1)" -> "bool"."""
+    match = _TYPE_RE.match(mysql_type) # Not lowercased as a whole: enum/set values keep their case
+    if not match: return mysql_type
+    base, size, modifiers = match.group(1).lower(), match.group(2), match.group(3).lower()
+    if base == "tinyint" and size == "1": return "bool"
+    short = _TYPE_ABBREVIATIONS.get(base, base)
+    if short in ("enum", "set") and size:
+        # Values are quoted and may contain commas or '' escaped quotes, e.g. enum('a','b,c','it''s')
+        short += "(" + "|".join(v.replace("''", "'") for v in _QUOTED_VALUE_RE.findall(size)) + ")"
+    elif short in _SIZED_TYPES and size:
+        short += f"({size.replace(' ', '')})"
+    if "unsigned" in modifiers: short += "u"
+    return short
+
+
+@dataclass
+class ColumnInfo:
+    """One row of `DESCRIBE` output."""
+    name: str
+    type: str
+    nullable: bool = True
+    key: str = ""           # PRI / UNI / MUL or empty
+    default: Optional[str] = None
+    extra: str = ""         # e.g. auto_increment
+
+    def to_text(self) -> str:
+        col_desc = f"  - `{self.name}` ({self.type})"
+        if self.key: col_desc += f" [{self.key}]"
+        if self.extra: col_desc += f" [{self.extra}]"
+        if not self.nullable: col_desc += " [NOT NULL]"
+        if self.default is not None: col_desc += f" [Default: {self.default}]"
+        return col_desc
+
+    def to_compact(self) -> str:
+        markers = ""
+        if self.key == "PRI": markers += "*"
+        elif self.key == "UNI": markers += "!"
+        if "auto_increment" in self.extra: markers += "+"
+        if self.nullable and self.key != "PRI": markers += "?"
+        return f"{self.name}:{abbreviate_type(self.type)}{markers}"
+
+
+@dataclass
+class ForeignKey:
+    column: str
+    ref_table: str
+    ref_column: str
+
+    def to_text(self) -> str:
+        return f"  - FK `{self.column}` -> `{self.ref_table}`.`{self.ref_column}`"
+
+    def to_compact(self) -> str:
+        return f"{self.column}>{self.ref_table}.{self.ref_column}"
+
+
+@dataclass
+class TableSchema:
+    name: str
+    columns: List[ColumnInfo] = field(default_factory=list)
+    foreign_keys: List[ForeignKey] = field(default_factory=list)
+    error: Optional[str] = None  # Set when the table could not be described
+
+    def find_column(self, name: str) -> Optional[ColumnInfo]:
+        """Case-insensitive lookup, MySQL column names are not case sensitive."""
+        lowered = name.lower()
+        for col in self.columns:
+            if col.name.lower() == lowered: return col
+        return None
+
+    def keyed_columns(self) -> Set[str]:
+        """Columns that lead an index according to DESCRIBE (PRI/UNI/MUL)."""
+        return {col.name for col in self.columns if col.key}
+
+    def to_text(self) -> str:
+        if self.error is not None:
+            return f"  Error describing table `{self.name}`: {self.error}"
+        lines = [f"Table `{self.name}` columns:"] + [col.to_text() for col in self.columns]
+        if self.foreign_keys:
+            lines += [f"Table `{self.name}` foreign keys:"] + [fk.to_text() for fk in self.foreign_keys]
+        return "\n".join(lines)
+
+    def to_compact(self, common: Optional[List[str]] = None) -> str:
+        """One line: `table(col:type, ...) -> fk refs`. `common` columns present in this table collapse to `@`."""
+        if self.error is not None:
+            return f"{self.name}(?) -- describe failed: {self.error}"
+        common = common or []
+        own = [col.to_compact() for col in self.columns]
+        has_common = bool(common) and all(c in own for c in common)
+        parts = [c for c in own if not (has_common and c in common)]
+        if has_common: parts.append("@")
+        line = f"{self.name}({', '.join(parts)})"
+        if self.foreign_keys:
+            line += " -> " + ", ".join(fk.to_compact() for fk in self.foreign_keys)
+        return line
+
+
+@dataclass
+class DatabaseSchema:
+    """Structured form of the schema loaded by `get_schema_details`."""
+    database: str
+    tables: Dict[str, TableSchema] = field(default_factory=dict)
+    fingerprint: Optional[Dict[str, str]] = None # Per-table digests from `fetch_schema_fingerprint`, taken at load time
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "DatabaseSchema":
+        """Inverse of `dataclasses.asdict`, e.g. for schemas stored in replay fixtures."""
+        tables = {name: TableSchema(name=table["name"], columns=[ColumnInfo(**col) for col in table["columns"]],
+                                    foreign_keys=[ForeignKey(**fk) for fk in table["foreign_keys"]], error=table.get("error"))
+                  for name, table in data.get("tables", {}).items()}
+        return cls(database=data.get("database", ""), tables=tables, fingerprint=data.get("fingerprint"))
+
+    def table_names(self) -> List[str]:
+        return list(self.tables.keys())
+
+    def find_table(self, name: str) -> Optional[TableSchema]:
+        if name in self.tables: return self.tables[name]
+        lowered = name.lower()
+        for table_name, table in self.tables.items():
+            if table_name.lower() == lowered: return table
+        return None
+
+    def to_text(self) -> str:
+        """Verbose DESCRIBE-style text, as used in the system prompt."""
+        schema_info = "Database Schema:\n"
+        schema_info += f"Tables: {', '.join(self.table_names())}\n\n"
+        for table in self.tables.values():
+            schema_info += table.to_text() + "\n\n"
+        return schema_info.strip()
+
+    def common_columns(self) -> List[str]:
+        """
+        Compact column signatures (name:type+markers) that occur together in many tables, e.g. created_at/updated_at.
+        Picks the group of signatures sharing the same set of tables that saves the most repetitions.
+        """
+        tables_by_sig: Dict[str, Set[str]] = {}
+        for table in self.tables.values():
+            for col in table.columns:
+                sig = col.to_compact()
+                # Primary keys stay inline, they matter too much for joins to hide behind `@`
+                if "*" not in sig: tables_by_sig.setdefault(sig, set()).add(table.name)
+        groups: Dict[frozenset, List[str]] = {}
+        for sig, table_names in tables_by_sig.items():
+            if len(table_names) >= COMMON_COLUMN_MIN_TABLES:
+                groups.setdefault(frozenset(table_names), []).append(sig)
+        if not groups: return []
+        best_tables = max(groups, key=lambda t: (len(t) - 1) * len(groups[t]))
+        return groups[best_tables]
+
+    def to_compact(self) -> str:
+        """One line per table, abbreviated types and de-duplicated common columns. See COMPACT_LEGEND."""
+        common = self.common_columns()
+        lines = [compact_legend(self.tables.values())]
+        if common:
+            lines.append(f"@ = common columns: {', '.join(common)}")
+        lines += [table.to_compact(common) for table in self.tables.values()]
+        return "\n".join(lines)
+
+    def render(self, schema_format: str = "compact") -> str:
+        if schema_format not in SCHEMA_FORMATS:
+            raise ValueError(f"Unknown schema format '{schema_format}'. Expected one of: {', '.join(SCHEMA_FORMATS)}")
+        return self.to_compact() if schema_format == "compact" else self.to_text()
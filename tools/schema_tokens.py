@@ -0,0 +1,75 @@
+"""
+Measures how many prompt tokens each schema representation costs.
+Run with `python -m tools.schema_tokens` (uses the same .env as the server).
+"""
+import os
+import asyncio
+import logging
+from typing import Callable, List
+
+from prompts import BASE_SYSTEM_PROMPT
+from tools.schema_model import SCHEMA_FORMATS, DatabaseSchema
+
+log = logging.getLogger(__name__)
+
+MODEL_NAME = "gemini-2.0-flash"
+CHARS_PER_TOKEN_ESTIMATE = 4 # Fallback when the Gemini token counter is unavailable
+
+def estimate_tokens(text: str) -> int:
+    return max(1, round(len(text) / CHARS_PER_TOKEN_ESTIMATE))
+
+def gemini_token_counter() -> Callable[[str], int]:
+    """Counts tokens with the Gemini API, falls back to a character-based estimate without a key/connection."""
+    api_key = os.environ.get("GEMINI_API_KEY")
+    if not api_key:
+        log.warning("GEMINI_API_KEY not set, using estimated token counts.")
+        return estimate_tokens
+    import google.generativeai as genai
+    genai.configure(api_key=api_key)
+    model = genai.GenerativeModel(MODEL_NAME)
+
+    def count(text: str) -> int:
+        try:
+            return model.count_tokens(text).total_tokens
+        except Exception as count_err:
+            log.warning(f"Token count failed, using estimate: {count_err}")
+            return estimate_tokens(text)
+    return count
+
+def measure_schema_formats(schema: DatabaseSchema, count_tokens: Callable[[str], int] = estimate_tokens) -> List[dict]:
+    """One row per representation: size of the schema text alone and of the full system prompt."""
+    measurements = []
+    for schema_format in SCHEMA_FORMATS:
+        schema_text = schema.render(schema_format)
+        system_prompt = BASE_SYSTEM_PROMPT.format(schema_placeholder=schema_text, db_name=schema.database)
+        measurements.append({
+            "format": schema_format,
+            "schema_chars": len(schema_text),
+            "schema_tokens": count_tokens(schema_text),
+            "prompt_tokens": count_tokens(system_prompt),
+        })
+    return measurements
+
+def format_measurements(schema: DatabaseSchema, measurements: List[dict]) -> str:
+    baseline = next(m for m in measurements if m["format"] == "verbose")
+    fk_count = sum(len(table.foreign_keys) for table in schema.tables.values())
+    lines = [f"Schema token usage for '{schema.database}' ({len(schema.tables)} tables, {fk_count} foreign keys):",
+             f"{'format':<10}{'schema chars':>14}{'schema tokens':>15}{'prompt tokens':>15}{'vs verbose':>12}"]
+    for m in measurements:
+        ratio = baseline["schema_tokens"] / m["schema_tokens"] if m["schema_tokens"] else 0.0
+        lines.append(f"{m['format']:<10}{m['schema_chars']:>14}{m['schema_tokens']:>15}{m['prompt_tokens']:>15}{ratio:>11.1f}x")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from tools.sql_tool import get_schema_details
+
+    load_dotenv()
+    cli_db_config = {"host": os.environ.get("DB_HOST", "localhost"), "user": os.environ.get("DB_USER"),
+                     "password": os.environ.get("DB_PASSWORD"), "database": os.environ.get("DB_NAME")}
+    cli_schema, schema_error = asyncio.run(get_schema_details(cli_db_config))
+    if schema_error:
+        print(schema_error)
+        raise SystemExit(1)
+    print(format_measurements(cli_schema, measure_schema_formats(cli_schema, gemini_token_counter())))
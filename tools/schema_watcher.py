@@ -0,0 +1,175 @@
+"""
+Background schema watcher: notices migrations without a service restart.
+
+Polls a cheap per-table fingerprint from information_schema, re-introspects only the tables that
+changed (in parallel over pooled connections) and swaps in a new DatabaseSchema. Sessions created
+from the old schema can catch up through `notice_since`, a compact delta instead of a full schema.
+"""
+import os
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+from mysql.connector import pooling
+
+from tools.schema_model import DatabaseSchema, TableSchema, compact_legend
+from tools.sql_tool import SCHEMA_PROMPT_FORMAT, fetch_schema_fingerprint, introspect_tables
+
+log = logging.getLogger(__name__)
+
+SCHEMA_POLL_SECONDS = float(os.environ.get("SCHEMA_POLL_SECONDS", "30")) # 0 disables the watcher
+SCHEMA_POOL_SIZE = int(os.environ.get("SCHEMA_POOL_SIZE", "4"))
+
+
+@dataclass
+class SchemaDelta:
+    added: List[TableSchema] = field(default_factory=list)
+    changed: List[TableSchema] = field(default_factory=list)
+    dropped: List[str] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.changed or self.dropped)
+
+    def to_notice(self, schema_format: str = "compact") -> str:
+        """Notice for sessions whose system prompt still has the old schema, in the prompt's schema format."""
+        render = TableSchema.to_compact if schema_format == "compact" else TableSchema.to_text
+        lines = []
+        if self.added: lines += [f"+ {render(table)}" for table in self.added]
+        if self.changed: lines += [f"~ {render(table)}" for table in self.changed]
+        if self.dropped: lines += [f"- {name}" for name in self.dropped]
+        return "\n".join(lines)
+
+
+class SchemaWatcher:
+    """Keeps `schema` current. `on_change(schema, delta)` is called after every swap."""
+
+    def __init__(self, db_config: dict, schema: DatabaseSchema,
+                 on_change: Optional[Callable[[DatabaseSchema, SchemaDelta], None]] = None,
+                 poll_seconds: float = SCHEMA_POLL_SECONDS, pool_size: int = SCHEMA_POOL_SIZE,
+                 schema_format: str = SCHEMA_PROMPT_FORMAT):
+        self.db_config = db_config
+        self.schema_format = schema_format
+        self.poll_seconds = poll_seconds
+        self.pool_size = max(1, pool_size)
+        self.on_change = on_change
+        self._schema = schema
+        self._fingerprint: Optional[Dict[str, str]] = schema.fingerprint # Baseline from load time, if available
+        self._deltas: List[SchemaDelta] = [] # Index i holds the delta from version i to i + 1
+        self._pool: Optional[pooling.MySQLConnectionPool] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def schema(self) -> DatabaseSchema:
+        return self._schema
+
+    @property
+    def version(self) -> int:
+        return len(self._deltas)
+
+    def notice_since(self, version: int) -> Tuple[Optional[str], int]:
+        """
+        Schema changes a session created at `version` has not seen yet.
+        Returns tuple: (notice_text or None, current_version).
+        """
+        deltas = self._deltas[version:]
+        if not deltas: return None, self.version
+        header = "[Schema update: the database schema changed since your schema was loaded. " \
+                 "+ added, ~ changed (new definition), - dropped. Use these definitions from now on.]"
+        if self.schema_format == "compact":
+            # The prompt's legend only lists the types in use at load time, so the notice carries its own
+            header += "\n" + compact_legend(table for delta in deltas for table in delta.added + delta.changed)
+        return header + "\n" + "\n".join(delta.to_notice(self.schema_format) for delta in deltas), self.version
+
+    # --- Blocking helpers, run in worker threads ---
+    def _get_pool(self) -> pooling.MySQLConnectionPool:
+        if self._pool is None:
+            self._pool = pooling.MySQLConnectionPool(pool_name="schema_watcher", pool_size=self.pool_size,
+                                                     connect_timeout=5, **self.db_config)
+        return self._pool
+
+    def _fetch_fingerprint(self) -> Dict[str, str]:
+        connection = self._get_pool().get_connection()
+        try:
+            return fetch_schema_fingerprint(connection, self._schema.database)
+        finally:
+            connection.close() # Returns it to the pool
+
+    def _close_pool(self):
+        if self._pool is None: return
+        # The pool has no public close; this disconnects every idle connection. Ones still checked out by
+        # an in-flight poll go back to the pool and are closed with the process.
+        closed = self._pool._remove_connections()
+        self._pool = None
+        log.info(f"Schema watcher closed {closed} pooled connection(s).")
+
+    def _introspect(self, table_names: List[str]) -> Dict[str, TableSchema]:
+        connection = self._get_pool().get_connection()
+        try:
+            return introspect_tables(connection, self._schema.database, table_names)
+        finally:
+            connection.close()
+
+    # --- Async API ---
+    async def _introspect_parallel(self, table_names: List[str]) -> Dict[str, TableSchema]:
+        """Splits the tables over the pool so the DESCRIBE passes run concurrently."""
+        batches = [table_names[i::self.pool_size] for i in range(self.pool_size)]
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(*(loop.run_in_executor(None, self._introspect, batch) for batch in batches if batch))
+        tables: Dict[str, TableSchema] = {}
+        for result in results: tables.update(result)
+        return tables
+
+    async def check_once(self) -> Optional[SchemaDelta]:
+        """Compares fingerprints and swaps in the new schema. Returns the delta, or None if nothing changed."""
+        fingerprint = await asyncio.get_running_loop().run_in_executor(None, self._fetch_fingerprint)
+        if self._fingerprint is None: # Schema was loaded without a fingerprint, the first poll sets the baseline
+            self._fingerprint = fingerprint
+            return None
+        if fingerprint == self._fingerprint: return None
+
+        previous = self._fingerprint
+        added_names = [name for name in fingerprint if name not in previous]
+        changed_names = [name for name in fingerprint if name in previous and fingerprint[name] != previous[name]]
+        dropped = [name for name in previous if name not in fingerprint]
+        refreshed = await self._introspect_parallel(added_names + changed_names)
+
+        tables = {name: table for name, table in self._schema.tables.items() if name not in dropped}
+        tables.update(refreshed)
+        delta = SchemaDelta(added=[refreshed[name] for name in added_names],
+                            changed=[refreshed[name] for name in changed_names], dropped=dropped)
+
+        # Single reference swap: readers see either the old or the new schema, never a mix
+        self._schema = DatabaseSchema(database=self._schema.database, tables=tables, fingerprint=fingerprint)
+        self._fingerprint = fingerprint
+        self._deltas.append(delta)
+        log.warning(f"Schema change detected (added: {added_names}, changed: {changed_names}, dropped: {dropped}).")
+        if self.on_change: self.on_change(self._schema, delta)
+        return delta
+
+    async def _run(self):
+        while True:
+            try:
+                await self.check_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as watch_err:
+                log.error(f"Schema watcher poll failed: {watch_err}", exc_info=True)
+            await asyncio.sleep(self.poll_seconds)
+
+    def start(self):
+        if self.poll_seconds <= 0:
+            log.warning("Schema watcher disabled (SCHEMA_POLL_SECONDS <= 0).")
+            return
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.get_running_loop().run_in_executor(None, self._close_pool)
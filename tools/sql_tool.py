@@ -1,7 +1,14 @@
 import mysql.connector
 from mysql.connector import Error
 import pandas as pd
+import os
 import logging
+import time
+from typing import Dict, List, Optional, Tuple
+
+from tools.schema_model import ColumnInfo, ForeignKey, TableSchema, DatabaseSchema
+from tools.result_profiler import ResultProfiler, PROFILE_BATCH_ROWS
+from tools.workload import workload_recorder, fingerprint_sql, fingerprint_id
 
 logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
 log = logging.getLogger(__name__)
@@ -9,61 +16,149 @@ log = logging.getLogger(__name__)
 MAX_ROWS_DISPLAY = 50
 MAX_COLS_DISPLAY = 20
 DISPLAY_WIDTH = 1000
+# Rows shown next to the profile when a SELECT exceeds MAX_ROWS_DISPLAY. Smaller than MAX_ROWS_DISPLAY on purpose:
+# the profile already covers every row, the sample only has to show what a row looks like, and the profile itself
+# costs prompt tokens (roughly one line per column), so the total stays near the size of a plain 50-row result.
+PROFILE_SAMPLE_ROWS = 20
 pd.set_option('display.max_rows', MAX_ROWS_DISPLAY)
 pd.set_option('display.max_columns', MAX_COLS_DISPLAY)
 pd.set_option('display.width', DISPLAY_WIDTH)
+SCHEMA_PROMPT_FORMAT = os.environ.get("SCHEMA_PROMPT_FORMAT", "compact") # "compact" or "verbose"
+
+FOREIGN_KEYS_QUERY = """
+    SELECT TABLE_NAME, COLUMN_NAME, REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME
+    FROM information_schema.KEY_COLUMN_USAGE
+    WHERE TABLE_SCHEMA = %s AND REFERENCED_TABLE_NAME IS NOT NULL
+    ORDER BY TABLE_NAME, CONSTRAINT_NAME, ORDINAL_POSITION
+"""
+# Cheap per-table fingerprint of the column definitions, used to detect migrations without DESCRIBE
+SCHEMA_FINGERPRINT_QUERY = """
+    SELECT TABLE_NAME, MD5(GROUP_CONCAT(
+        CONCAT_WS(':', COLUMN_NAME, COLUMN_TYPE, IS_NULLABLE, COLUMN_KEY, IFNULL(COLUMN_DEFAULT, ''), EXTRA)
+        ORDER BY ORDINAL_POSITION SEPARATOR '|'))
+    FROM information_schema.COLUMNS
+    WHERE TABLE_SCHEMA = %s
+    GROUP BY TABLE_NAME
+"""
+SCHEMA_FK_FINGERPRINT_QUERY = """
+    SELECT TABLE_NAME, MD5(GROUP_CONCAT(
+        CONCAT_WS(':', CONSTRAINT_NAME, COLUMN_NAME, REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME)
+        ORDER BY CONSTRAINT_NAME, ORDINAL_POSITION SEPARATOR '|'))
+    FROM information_schema.KEY_COLUMN_USAGE
+    WHERE TABLE_SCHEMA = %s AND REFERENCED_TABLE_NAME IS NOT NULL
+    GROUP BY TABLE_NAME
+"""
+
+def _describe_table(cursor, table_name: str) -> TableSchema:
+    """Runs DESCRIBE for one table; errors are kept on the TableSchema."""
+    try:
+        cursor.execute(f"DESCRIBE `{table_name}`;")
+        columns = [
+            ColumnInfo(name=col[0], type=col[1], nullable=(col[2] != "NO"), key=col[3] or "", default=col[4], extra=col[5] or "")
+            for col in cursor.fetchall() # (Field, Type, Null, Key, Default, Extra)
+        ]
+        return TableSchema(name=table_name, columns=columns)
+    except Error as desc_err:
+        log.warning(f"Could not describe table `{table_name}`: {desc_err.msg}")
+        return TableSchema(name=table_name, error=desc_err.msg)
+
+def _load_foreign_keys(cursor, database: str, tables: Dict[str, TableSchema]):
+    """Attaches foreign keys from information_schema; the tables stay usable (without joins) if this fails."""
+    try:
+        cursor.execute(FOREIGN_KEYS_QUERY, (database,))
+        for table_name, column, ref_table, ref_column in cursor.fetchall():
+            if table_name in tables:
+                tables[table_name].foreign_keys.append(ForeignKey(column, ref_table, ref_column))
+    except Error as fk_err:
+        log.warning(f"Could not load foreign keys: {fk_err.msg}")
+
+def introspect_tables(connection, database: str, table_names: List[str]) -> Dict[str, TableSchema]:
+    """DESCRIBE + foreign keys for the given tables over an open connection (blocking)."""
+    cursor = connection.cursor()
+    try:
+        tables = {table_name: _describe_table(cursor, table_name) for table_name in table_names}
+        _load_foreign_keys(cursor, database, tables)
+        return tables
+    finally:
+        cursor.close()
 
-async def get_schema_info(db_config: dict) -> str:
-    """Connects to MySQL and retrieves schema information."""
-    schema_info = "Database Schema:\n"
+def fetch_schema_fingerprint(connection, database: str) -> Dict[str, str]:
+    """Returns {table_name: md5 of its column definitions[:md5 of its foreign keys]} from information_schema (blocking)."""
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SET SESSION group_concat_max_len = 1048576;") # Default 1024 would truncate wide tables
+        cursor.execute(SCHEMA_FINGERPRINT_QUERY, (database,))
+        fingerprint = {table_name: digest for table_name, digest in cursor.fetchall()}
+        # Foreign keys live in KEY_COLUMN_USAGE, an added/dropped constraint does not touch COLUMNS
+        cursor.execute(SCHEMA_FK_FINGERPRINT_QUERY, (database,))
+        for table_name, fk_digest in cursor.fetchall():
+            if table_name in fingerprint: fingerprint[table_name] += f":{fk_digest}"
+        return fingerprint
+    finally:
+        cursor.close()
+
+async def get_schema_details(db_config: dict) -> Tuple[Optional[DatabaseSchema], Optional[str]]:
+    """
+    Connects to MySQL and retrieves the structured schema.
+    Returns tuple: (schema, error_msg). Exactly one of them is None.
+    """
     connection = None
     cursor = None
     try:
         connection = mysql.connector.connect(**db_config, connect_timeout=5)
         if not connection.is_connected():
             log.error("Schema Error: Could not connect to the database.")
-            return "Schema Error: Could not connect to the database."
+            return None, "Schema Error: Could not connect to the database."
 
         cursor = connection.cursor()
         cursor.execute("SHOW TABLES;")
         tables = cursor.fetchall()
         if not tables:
             log.warning(f"Schema Info: No tables found in database '{db_config.get('database')}'.")
-            return "Schema Info: No tables found in the database."
+            return None, "Schema Info: No tables found in the database."
 
-        table_names = [table[0] for table in tables]
-        schema_info += f"Tables: {', '.join(table_names)}\n\n"
-
-        for table_name in table_names:
-            try:
-                cursor.execute(f"DESCRIBE `{table_name}`;")
-                columns = cursor.fetchall()
-                schema_info += f"Table `{table_name}` columns:\n"
-                col_descriptions = []
-                for col in columns: # (Field, Type, Null, Key, Default, Extra)
-                    col_desc = f"  - `{col[0]}` ({col[1]})" # Name (Type)
-                    if col[3]: col_desc += f" [{col[3]}]"      # Key
-                    if col[5]: col_desc += f" [{col[5]}]"      # Extra
-                    if col[2] == "NO": col_desc += " [NOT NULL]"
-                    if col[4] is not None: col_desc += f" [Default: {col[4]}]"
-                    col_descriptions.append(col_desc)
-                schema_info += "\n".join(col_descriptions) + "\n\n"
-            except Error as desc_err:
-                schema_info += f"  Error describing table `{table_name}`: {desc_err.msg}\n\n"
-                log.warning(f"Could not describe table `{table_name}`: {desc_err.msg}")
-
-        return schema_info.strip()
+        schema = DatabaseSchema(database=db_config.get('database', ''))
+        try:
+            # Taken before DESCRIBE so a migration racing the load shows up as a change on the watcher's first poll
+            schema.fingerprint = fetch_schema_fingerprint(connection, schema.database)
+        except Error as fp_err:
+            log.warning(f"Could not fetch schema fingerprint: {fp_err.msg}")
+        schema.tables = introspect_tables(connection, schema.database, [table[0] for table in tables])
+        return schema, None
 
     except Error as err:
         log.error(f"MySQL Error fetching schema: {err.errno}, {err.msg}", exc_info=True)
-        return f"Schema Error: Failed to retrieve schema. {err.msg}"
+        return None, f"Schema Error: Failed to retrieve schema. {err.msg}"
     except Exception as e:
         log.error(f"General Error fetching schema: {str(e)}", exc_info=True)
-        return f"Schema Error: An unexpected error occurred: {str(e)}"
+        return None, f"Schema Error: An unexpected error occurred: {str(e)}"
     finally:
         if cursor: cursor.close()
         if connection and connection.is_connected(): connection.close()
 
+async def get_schema_info(db_config: dict, schema_format: str = SCHEMA_PROMPT_FORMAT) -> str:
+    """Connects to MySQL and retrieves schema information, rendered as "compact" or "verbose" text."""
+    schema, error_msg = await get_schema_details(db_config)
+    if error_msg: return error_msg
+    return schema.render(schema_format)
+
+def _record_workload(connection, sql_command: str, elapsed_ms: float, rows_returned: int):
+    """Feeds the index advisor. Never allowed to fail the query it observes."""
+    if not workload_recorder.enabled: return
+    explain_cursor = None
+    try:
+        fingerprint = fingerprint_sql(sql_command)
+        plan = None
+        if workload_recorder.needs_plan(fingerprint_id(fingerprint)):
+            explain_cursor = connection.cursor(dictionary=True)
+            explain_cursor.execute(f"EXPLAIN {sql_command}")
+            plan = explain_cursor.fetchall()
+        workload_recorder.record(sql_command, elapsed_ms, rows_returned, plan=plan, fingerprint=fingerprint)
+    except Exception as rec_err:
+        log.warning(f"Workload recording skipped: {rec_err}")
+    finally:
+        if explain_cursor: explain_cursor.close()
+
 async def execute_sql(sql_command: str, db_config: dict) -> str:
     """Connects to MySQL, executes SQL, returns results/status string."""
     connection = None
@@ -75,27 +170,58 @@ async def execute_sql(sql_command: str, db_config: dict) -> str:
             return "Error: Could not connect to the database."
 
         cursor = connection.cursor(dictionary=True)
+        start_time = time.perf_counter()
         cursor.execute(sql_command)
 
         command_type = sql_command.strip().upper().split(maxsplit=1)[0] if sql_command.strip() else ""
 
         if command_type in ("SELECT", "SHOW", "DESC", "DESCRIBE", "EXPLAIN"):
-            results = cursor.fetchall()
+            profiler = None
+            profile_seconds = 0.0 # Excluded from the recorded query latency
+            if command_type == "SELECT":
+                results = cursor.fetchmany(PROFILE_BATCH_ROWS)
+                num_rows = len(results)
+                if num_rows > MAX_ROWS_DISPLAY:
+                    # Too many rows to show: profile the full result batch by batch instead of truncating blindly
+                    batch = results
+                    results = results[:MAX_ROWS_DISPLAY] # Plain truncated output if profiling fails
+                    try:
+                        profiler = ResultProfiler(cursor.column_names)
+                    except Exception as profile_err:
+                        log.error(f"Error creating result profiler: {profile_err}", exc_info=True)
+                    while batch:
+                        if profiler:
+                            profile_start = time.perf_counter()
+                            try: profiler.update(batch)
+                            except Exception as profile_err:
+                                log.error(f"Error profiling results, profile skipped: {profile_err}", exc_info=True)
+                                profiler = None
+                            profile_seconds += time.perf_counter() - profile_start
+                        batch = cursor.fetchmany(PROFILE_BATCH_ROWS)
+                        num_rows += len(batch)
+                    if profiler: results = results[:PROFILE_SAMPLE_ROWS]
+                _record_workload(connection, sql_command, (time.perf_counter() - start_time - profile_seconds) * 1000, num_rows)
+            else: # SHOW/DESCRIBE/EXPLAIN output is metadata, not data worth profiling
+                results = cursor.fetchall()
+                num_rows = len(results)
+                results = results[:MAX_ROWS_DISPLAY]
             if not results:
                 return "Query executed successfully, no results returned."
             else:
                 try:
                     df = pd.DataFrame(results)
-                    num_rows = len(df)
-                    if num_rows > MAX_ROWS_DISPLAY:
-                         output = f"Query Results (showing first {MAX_ROWS_DISPLAY} of {num_rows} rows):\n{df.head(MAX_ROWS_DISPLAY).to_string(index=False)}"
+                    if profiler:
+                         output = (f"Query Results ({num_rows} rows, showing first {len(df)} as a sample):\n{df.to_string(index=False)}"
+                                   f"\n\n{profiler.to_text()}")
+                    elif num_rows > len(df):
+                         output = f"Query Results (showing first {len(df)} of {num_rows} rows):\n{df.to_string(index=False)}"
                     else:
                          output = f"Query Results:\n{df.to_string(index=False)}"
                     return output
                 except Exception as format_err:
                      log.error(f"Error formatting results with Pandas: {format_err}", exc_info=True)
-                     preview = str(results[:5]) + ('...' if len(results) > 5 else '') # Shorter preview
-                     return f"Query successful ({len(results)} rows), error formatting: {format_err}\nRaw preview: {preview}"
+                     preview = str(results[:5]) + ('...' if num_rows > 5 else '') # Shorter preview
+                     return f"Query successful ({num_rows} rows), error formatting: {format_err}\nRaw preview: {preview}"
         else: # DML/DDL
             try:
                 connection.commit()
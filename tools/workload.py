@@ -0,0 +1,134 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import List, Optional
+
+log = logging.getLogger(__name__)
+
+# Local store for the observed query workload (aggregated per fingerprint, so it stays small)
+WORKLOAD_DB_PATH = os.environ.get("SQL_WORKLOAD_DB", "sql_workload.db")
+WORKLOAD_RECORDING = os.environ.get("SQL_WORKLOAD_RECORDING", "1").lower() not in ("0", "false", "no", "off")
+PLAN_REFRESH_SECONDS = 3600 # Re-EXPLAIN a fingerprint at most once an hour (plans change after new indexes)
+MAX_SAMPLE_SQL_LEN = 4000
+
+# One pass over the statement so quotes, backtick identifiers and comments are recognized in source order:
+# a `#` inside `col#2` or a string is not a comment, and `5--3` is arithmetic (MySQL needs "-- " plus whitespace).
+_TOKEN_RE = re.compile(r"""
+    (?P<ident>`(?:[^`]|``)*`)
+  | (?P<string>'(?:[^'\\]|\\.|'')*'|"(?:[^"\\]|\\.|"")*")
+  | (?P<comment>/\*.*?\*/|--(?=\s|$)[^\n]*|\#[^\n]*)
+  | (?P<number>(?<![\w.])-?(?:0x[0-9a-f]+|\d+(?:\.\d+)?(?:e[+-]?\d+)?)\b)
+""", re.IGNORECASE | re.DOTALL | re.VERBOSE)
+_IN_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+def _normalize_token(match: re.Match) -> str:
+    if match.group("ident"): return match.group("ident")
+    if match.group("comment"): return " "
+    return "?" # String or numeric literal
+
+def fingerprint_sql(sql_command: str) -> str:
+    """
+    Normalizes a statement so that queries differing only in literals share a fingerprint.
+    e.g. "SELECT * FROM t WHERE id = 5 AND name IN ('a','b')" -> "select * from t where id = ? and name in (?+)"
+    """
+    fingerprint = _TOKEN_RE.sub(_normalize_token, sql_command)
+    fingerprint = _IN_LIST_RE.sub("(?+)", fingerprint)
+    fingerprint = _WHITESPACE_RE.sub(" ", fingerprint).strip().rstrip(";").strip()
+    return fingerprint.lower()
+
+def fingerprint_id(fingerprint: str) -> str:
+    return hashlib.sha1(fingerprint.encode("utf-8")).hexdigest()[:16]
+
+
+class WorkloadRecorder:
+    """Aggregates latency and EXPLAIN plans per SQL fingerprint in a local SQLite file."""
+
+    def __init__(self, db_path: str = WORKLOAD_DB_PATH, enabled: bool = WORKLOAD_RECORDING):
+        self.db_path = db_path
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS query_fingerprints (
+                    fingerprint_id TEXT PRIMARY KEY,
+                    fingerprint TEXT NOT NULL,
+                    sample_sql TEXT NOT NULL,
+                    calls INTEGER NOT NULL DEFAULT 0,
+                    total_ms REAL NOT NULL DEFAULT 0,
+                    max_ms REAL NOT NULL DEFAULT 0,
+                    rows_returned INTEGER NOT NULL DEFAULT 0,
+                    explain_json TEXT,
+                    explained_at REAL,
+                    first_seen REAL NOT NULL,
+                    last_seen REAL NOT NULL
+                )""")
+            self._conn.commit()
+        return self._conn
+
+    def needs_plan(self, fp_id: str) -> bool:
+        """True if the fingerprint has no EXPLAIN plan yet, or the stored one is stale."""
+        if not self.enabled: return False
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT explained_at FROM query_fingerprints WHERE fingerprint_id = ?", (fp_id,)
+            ).fetchone()
+        if row is None or row["explained_at"] is None: return True
+        return time.time() - row["explained_at"] > PLAN_REFRESH_SECONDS
+
+    def record(self, sql_command: str, elapsed_ms: float, rows_returned: int, plan: Optional[list] = None,
+               fingerprint: Optional[str] = None):
+        if not self.enabled: return
+        fingerprint = fingerprint or fingerprint_sql(sql_command)
+        fp_id = fingerprint_id(fingerprint)
+        now = time.time()
+        explain_json = json.dumps(plan, default=str) if plan is not None else None
+        with self._lock:
+            conn = self._connect()
+            conn.execute("""
+                INSERT INTO query_fingerprints
+                    (fingerprint_id, fingerprint, sample_sql, calls, total_ms, max_ms, rows_returned,
+                     explain_json, explained_at, first_seen, last_seen)
+                VALUES (?, ?, ?, 1, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(fingerprint_id) DO UPDATE SET
+                    sample_sql = excluded.sample_sql,
+                    calls = calls + 1,
+                    total_ms = total_ms + excluded.total_ms,
+                    max_ms = MAX(max_ms, excluded.max_ms),
+                    rows_returned = rows_returned + excluded.rows_returned,
+                    explain_json = COALESCE(excluded.explain_json, explain_json),
+                    explained_at = COALESCE(excluded.explained_at, explained_at),
+                    last_seen = excluded.last_seen
+            """, (fp_id, fingerprint, sql_command[:MAX_SAMPLE_SQL_LEN], elapsed_ms, elapsed_ms, rows_returned,
+                  explain_json, now if explain_json is not None else None, now, now))
+            conn.commit()
+
+    def fingerprints(self) -> List[dict]:
+        """All recorded fingerprints, most expensive (total time) first. `plan` is the decoded EXPLAIN output."""
+        with self._lock:
+            rows = self._connect().execute("SELECT * FROM query_fingerprints ORDER BY total_ms DESC").fetchall()
+        entries = []
+        for row in rows:
+            entry = dict(row)
+            entry["plan"] = json.loads(entry.pop("explain_json")) if row["explain_json"] else None
+            entries.append(entry)
+        return entries
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+workload_recorder = WorkloadRecorder()